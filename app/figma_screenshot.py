@@ -1,45 +1,161 @@
 import os
-import requests
+import asyncio
+import concurrent.futures
+import aiohttp
+import orjson
 import json
-from PIL import Image
-from io import BytesIO
 import re
 
 # --- Configuration ---
 FIGMA_API_TOKEN = os.environ.get("FIGMA_API_TOKEN")
 OUTPUT_DIR = "figma_screenshots"
+MAX_CONCURRENT_REQUESTS = 16  # Keeps us under Figma's rate limits
+RENDER_BATCH_SIZE = 100  # Node IDs per render request
+MAX_WRITE_WORKERS = 8
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0  # Seconds before the first retry, doubled on each attempt
+MAX_RETRY_DELAY = 60  # Cap on a server-supplied Retry-After
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Branch URLs look like /design/<file key>/branch/<branch key>/...; the API wants the branch key
+FIGMA_FILE_KEY_RE = re.compile(r"figma\.com/(?:file|design)/([A-Za-z0-9]+)(?:/branch/([A-Za-z0-9]+))?")
 
 # --- Helper Functions ---
 
 def get_figma_file_key(url):
     """Extracts the file key from a Figma URL."""
-    parts = url.split("/")
-    if "file" in parts:
-        return parts[parts.index("file") + 1]
-    elif "design" in parts:
-        return parts[parts.index("design") + 1]
-    return None
-
-
-def get_figma_file(file_key, api_token):
+    match = FIGMA_FILE_KEY_RE.search(url)
+    if not match:
+        return None
+    return match.group(2) or match.group(1)
+
+
+async def get_with_retry(session, url, read, **kwargs):
+    """GETs a URL and reads the body, retrying rate limits and transient errors with backoff."""
+    for attempt in range(MAX_RETRIES + 1):
+        delay = RETRY_BACKOFF * 2 ** attempt
+        try:
+            async with session.get(url, **kwargs) as response:
+                response.raise_for_status()
+                return await read(response)
+        except aiohttp.ClientResponseError as e:
+            if e.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise
+            retry_after = (e.headers or {}).get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, min(int(retry_after), MAX_RETRY_DELAY))
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+            # ClientPayloadError covers bodies cut off mid-transfer, common on CDN downloads
+            if attempt == MAX_RETRIES:
+                raise
+        # Callers hold their semaphore slot while sleeping, which also eases off Figma's rate limit
+        await asyncio.sleep(delay)
+
+async def get_figma_file(session, file_key, api_token):
     """Fetches the Figma file data."""
     url = f"https://api.figma.com/v1/files/{file_key}"
+    # Only pages and their top-level nodes are captured, so skip the rest of the tree
+    params = {"depth": 2}
     headers = {"X-Figma-Token": api_token}
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()  # Raise an exception for bad status codes
-    return response.json()
-
-def get_node_image(file_key, node_id, api_token):
-    """Fetches a rendered image of a specific node."""
-    url = f"https://api.figma.com/v1/images/{file_key}?ids={node_id}&format=png"
+    # File payloads can be tens of MB; orjson parses the raw bytes directly
+    payload = await get_with_retry(session, url, aiohttp.ClientResponse.read, params=params, headers=headers)
+    return orjson.loads(payload)
+
+async def fetch_image_urls(session, file_key, node_ids, api_token, sem):
+    """Fetches render URLs for a batch of nodes in a single request."""
+    url = f"https://api.figma.com/v1/images/{file_key}"
+    params = {"ids": ",".join(node_ids), "format": "png"}
     headers = {"X-Figma-Token": api_token}
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    image_url = response.json()["images"][node_id]
-    
-    image_response = requests.get(image_url)
-    image_response.raise_for_status()
-    return Image.open(BytesIO(image_response.content))
+    async with sem:
+        result = await get_with_retry(session, url, aiohttp.ClientResponse.json, params=params, headers=headers)
+        return result["images"]
+
+async def download_image(session, image_url, sem):
+    """Downloads a rendered image as PNG bytes."""
+    # The image URL points at Figma's CDN, so don't send the API token along
+    async with sem:
+        return await get_with_retry(session, image_url, aiohttp.ClientResponse.read)
+
+def save_image(image_bytes, output_path):
+    """Saves PNG bytes returned by Figma to disk."""
+    # Figma already returns encoded PNGs, so write them as-is rather than re-encoding
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(image_bytes)
+
+async def capture_node(session, image_url, node_id, node_name, output_path, sem, write_pool):
+    """Downloads a single rendered node and saves it, reporting errors instead of raising."""
+    print(f"    - Capturing node: {node_name} ({node_id})")
+    if not image_url:
+        print(f"      - Error capturing node {node_id}: Figma could not render it")
+        return
+    try:
+        image_bytes = await download_image(session, image_url, sem)
+        # Saving is blocking, hand it to the write pool so downloads keep flowing
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(write_pool, save_image, image_bytes, output_path)
+        print(f"      - Saved to: {output_path}")
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        print(f"      - Error capturing node {node_id}: {e}")
+
+def collect_nodes(figma_data):
+    """Maps node_id -> (node_name, output_path) for every top-level node, with unique paths."""
+    nodes = {}
+    used_paths = set()
+    for page in figma_data["document"]["children"]:
+        if page["type"] == "CANVAS":
+            print(f"  - Processing page: {page['name']}")
+            for node in page["children"]:
+                node_name = sanitize_filename(node["name"])
+                output_path = os.path.join(OUTPUT_DIR, f"{page['name']}_{node_name}.png")
+                if output_path.lower() in used_paths:
+                    # Frames often share default names like "Frame 1"; the node id tells them apart
+                    node_id = sanitize_filename(node["id"])
+                    output_path = os.path.join(OUTPUT_DIR, f"{page['name']}_{node_name}_{node_id}.png")
+                used_paths.add(output_path.lower())
+                nodes[node["id"]] = (node_name, output_path)
+    return nodes
+
+async def capture_all_nodes(session, file_key, figma_data, api_token):
+    """Captures every top-level node of every page, rendering them in batches."""
+    # node_id -> (node_name, output_path), so filenames survive the batching
+    nodes = collect_nodes(figma_data)
+    node_ids = list(nodes)
+    chunks = [node_ids[i:i + RENDER_BATCH_SIZE] for i in range(0, len(node_ids), RENDER_BATCH_SIZE)]
+
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    results = await asyncio.gather(
+        *[fetch_image_urls(session, file_key, chunk, api_token, sem) for chunk in chunks],
+        return_exceptions=True,
+    )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WRITE_WORKERS) as write_pool:
+        tasks = []
+        for chunk, image_urls in zip(chunks, results):
+            if isinstance(image_urls, BaseException):
+                print(f"    - Error rendering {len(chunk)} nodes: {image_urls}")
+                continue
+            for node_id in chunk:
+                node_name, output_path = nodes[node_id]
+                tasks.append(capture_node(session, image_urls.get(node_id), node_id, node_name, output_path, sem, write_pool))
+
+        await asyncio.gather(*tasks)
+
+async def capture_figma_file(file_key, api_token):
+    """Fetches the Figma file and captures its nodes over one shared connection pool."""
+    async with aiohttp.ClientSession() as session:
+        print(f"Fetching Figma file: {file_key}")
+        try:
+            figma_data = await get_figma_file(session, file_key, api_token)
+        except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+            print(f"Error fetching Figma file: {e}")
+            return False
+
+        if not os.path.exists(OUTPUT_DIR):
+            os.makedirs(OUTPUT_DIR)
+
+        print("Processing pages and nodes...")
+        await capture_all_nodes(session, file_key, figma_data, api_token)
+        return True
 
 def sanitize_filename(name):
     # Remove or replace invalid filename characters for Windows
@@ -61,34 +177,9 @@ def main():
         print("Error: Could not extract file key from the provided URL.")
         return
 
-    print(f"Fetching Figma file: {file_key}")
-    try:
-        figma_data = get_figma_file(file_key, FIGMA_API_TOKEN)
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching Figma file: {e}")
+    if not asyncio.run(capture_figma_file(file_key, FIGMA_API_TOKEN)):
         return
 
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-
-    print("Processing pages and nodes...")
-    for page in figma_data["document"]["children"]:
-        if page["type"] == "CANVAS":
-            print(f"  - Processing page: {page['name']}")
-            for node in page["children"]:
-                node_id = node["id"]
-                node_name = sanitize_filename(node["name"])
-                output_path = os.path.join(OUTPUT_DIR, f"{page['name']}_{node_name}.png")
-
-                print(f"    - Capturing node: {node_name} ({node_id})")
-                try:
-                    image = get_node_image(file_key, node_id, FIGMA_API_TOKEN)
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                    image.save(output_path)
-                    print(f"      - Saved to: {output_path}")
-                except requests.exceptions.RequestException as e:
-                    print(f"      - Error capturing node {node_id}: {e}")
-
     print("\nScreenshot process complete.")
     print(f"Screenshots saved in the '{OUTPUT_DIR}' directory.")
 
@@ -1,5 +1,8 @@
 import os
+import asyncio
 import base64
+import hashlib
+import mimetypes
 import openai
 import json
 
@@ -7,47 +10,159 @@ import json
 SCREENSHOTS_DIR = "figma_screenshots"
 # LLM_MODEL = "gpt-4"
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+MAX_CONCURRENT_ANALYSES = 8
+IMAGES_PER_REQUEST = 8  # gpt-4o-mini stays accurate with ~10 images per request
+ANALYSIS_MODEL = "gpt-4o-mini"
+ANALYSIS_PROMPT = (
+    "For each of the following UI screenshots, generate a summary describing the UI components, "
+    "layout, and potential interactions. Return a JSON object of the form "
+    '{"descriptions": [{"index": i, "description": "..."}]} with one entry per image, '
+    "where i is the number given before the image."
+)
+ANALYSIS_ERROR = "Error during analysis."
+CACHE_DIR = ".cache"
+# Part of every cache key, so changing the model or prompt invalidates old analyses
+CACHE_VERSION = hashlib.sha256(f"{ANALYSIS_MODEL}\n{ANALYSIS_PROMPT}".encode("utf-8")).hexdigest()[:12]
 
 # --- Helper Functions ---
 
-def encode_image_to_base64(filepath):
-    """Encodes an image file to a base64 string."""
+ENCODE_CHUNK_SIZE = 57 * 1024  # Multiple of 3, so chunks encode without padding
+
+def encode_image_to_data_url(filepath):
+    """Encodes an image file to a base64 data URL, streaming it in chunks."""
+    mime_type = mimetypes.guess_type(filepath)[0] or "image/png"
+    buf = bytearray(f"data:{mime_type};base64,".encode("ascii"))
+    with open(filepath, "rb") as image_file:
+        while chunk := image_file.read(ENCODE_CHUNK_SIZE):
+            buf.extend(base64.b64encode(chunk))
+    return buf.decode("ascii")
+
+def hash_image(filepath):
+    """Returns the SHA-256 hex digest of an image file's contents."""
+    digest = hashlib.sha256()
     with open(filepath, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+        while chunk := image_file.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-def analyze_image_with_gpt4(image_path, client):
-    print(f"Analyzing image: {os.path.basename(image_path)}...")
+def get_cache_path(image_hash):
+    """Returns the cache file for an image hash under the current model and prompt."""
+    return os.path.join(CACHE_DIR, f"{CACHE_VERSION}-{image_hash}.json")
+
+def load_cached_analysis(image_hash):
+    """Returns the cached description for an image hash, or None on a cache miss."""
     try:
-        base64_image = encode_image_to_base64(image_path)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        with open(get_cache_path(image_hash), "r", encoding="utf-8") as f:
+            return json.load(f)["description"]
+    except (OSError, ValueError, KeyError, TypeError):
+        # Missing, truncated or corrupt cache entries are just misses
+        return None
+
+def save_cached_analysis(image_hash, analysis):
+    """Stores a successful analysis under the image's content hash."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(get_cache_path(image_hash), "w", encoding="utf-8") as f:
+        json.dump(analysis, f)
+
+def parse_batch_descriptions(result, image_count):
+    """Maps a batched JSON reply to {image position: description}.
+
+    Only replies whose indices cover the batch exactly, 0-based or uniformly 1-based, are placed.
+    Anything else is left out so those images get ANALYSIS_ERROR and are retried, not cached.
+    """
+    items = result.get("descriptions", []) if isinstance(result, dict) else result
+    items = [item for item in items if isinstance(item, dict)]
+    try:
+        indices = [int(item.get("index")) for item in items]
+    except (TypeError, ValueError):
+        return {}
+
+    if sorted(indices) == list(range(image_count)):
+        offset = 0
+    elif sorted(indices) == list(range(1, image_count + 1)):
+        offset = 1
+    else:
+        return {}
+
+    return {
+        index - offset: item["description"]
+        for index, item in zip(indices, items)
+        if isinstance(item.get("description"), str)
+    }
+
+async def analyze_images_with_gpt4(image_paths, client, sem):
+    """Analyzes a batch of images in a single request, returning one analysis per image."""
+    image_names = [os.path.basename(image_path) for image_path in image_paths]
+    async with sem:
+        print(f"Analyzing images: {', '.join(image_names)}...")
+        try:
+            content = [
                 {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": "Generate a summary describing the UI components, layout, and potential interactions."},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}"
-                            }
-                        }
-                    ]
+                    "type": "text",
+                    "text": ANALYSIS_PROMPT
                 }
-            ],
-            max_tokens=1024,
-        )
-        summary = response.choices[0].message.content
-        return {
-            "image": os.path.basename(image_path),
-            "description": summary
-        }
-    except Exception as e:
-        print(f"Error analyzing image {os.path.basename(image_path)}: {e}")
-        return {
-            "image": os.path.basename(image_path),
-            "description": "Error during analysis."
-        }
+            ]
+            for index, image_path in enumerate(image_paths):
+                content.append({"type": "text", "text": f"Image {index}:"})
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": encode_image_to_data_url(image_path)
+                    }
+                })
+
+            response = await client.chat.completions.create(
+                model=ANALYSIS_MODEL,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": content
+                    }
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=1024 * len(image_paths),
+            )
+            result = json.loads(response.choices[0].message.content)
+            descriptions = parse_batch_descriptions(result, len(image_paths))
+        except Exception as e:
+            print(f"Error analyzing images {', '.join(image_names)}: {e}")
+            descriptions = {}
+
+        return [
+            {
+                "image": image_name,
+                "description": descriptions.get(index, ANALYSIS_ERROR)
+            }
+            for index, image_name in enumerate(image_names)
+        ]
+
+async def analyze_all_images(image_files):
+    """Analyzes all images in concurrent batches, reusing cached results for unchanged images."""
+    analyses = {}
+    uncached = {}  # image path -> content hash
+    for image_file in image_files:
+        image_hash = hash_image(image_file)
+        description = load_cached_analysis(image_hash)
+        if description is None:
+            uncached[image_file] = image_hash
+        else:
+            print(f"Using cached analysis for: {os.path.basename(image_file)}")
+            analyses[image_file] = {"image": os.path.basename(image_file), "description": description}
+
+    pending = list(uncached)
+    if pending:
+        sem = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+        batches = [pending[i:i + IMAGES_PER_REQUEST] for i in range(0, len(pending), IMAGES_PER_REQUEST)]
+        async with openai.AsyncOpenAI(api_key=OPENAI_API_KEY) as client:
+            results = await asyncio.gather(*(analyze_images_with_gpt4(batch, client, sem) for batch in batches))
+
+        for batch, batch_analyses in zip(batches, results):
+            for image_file, analysis in zip(batch, batch_analyses):
+                analyses[image_file] = analysis
+                if analysis["description"] != ANALYSIS_ERROR:
+                    save_cached_analysis(uncached[image_file], analysis)
+
+    return [analyses[image_file] for image_file in image_files]
 
 def generate_roadmap_with_gpt4(image_analyses, client):
     """Generates a project roadmap from the analysis of all images using GPT-4."""
@@ -117,13 +232,10 @@ def main():
         print(f"No images found in the '{SCREENSHOTS_DIR}' directory.")
         return
 
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
     # Step 1: Analyze each image
-    all_analyses = []
-    for image_file in image_files:
-        analysis = analyze_image_with_gpt4(image_file, client)
-        all_analyses.append(analysis)
+    all_analyses = asyncio.run(analyze_all_images(image_files))
+
+    client = openai.OpenAI(api_key=OPENAI_API_KEY)
 
     # Step 2: Generate the roadmap
     roadmap = generate_roadmap_with_gpt4(all_analyses, client)
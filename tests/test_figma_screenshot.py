@@ -0,0 +1,104 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import app.figma_screenshot as figma_screenshot
+
+TRUNCATED = object()
+
+
+def fetch_with_statuses(statuses):
+    """Serves the given error statuses in turn, then a 200, and fetches through get_with_retry."""
+    remaining = list(statuses)
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request.path)
+        if remaining:
+            status = remaining.pop(0)
+            if status is TRUNCATED:
+                # Promise more bytes than are sent, then drop the connection
+                response = web.StreamResponse()
+                response.content_length = 100
+                await response.prepare(request)
+                await response.write(b"partial")
+                request.transport.close()
+                return response
+            return web.Response(status=status)
+        return web.Response(body=b"png bytes")
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/image", handler)
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            url = str(server.make_url("/image"))
+            return await figma_screenshot.get_with_retry(session, url, aiohttp.ClientResponse.read)
+
+    return asyncio.run(run()), requests_seen
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(figma_screenshot, "RETRY_BACKOFF", 0)
+
+
+def test_retries_rate_limits_and_server_errors():
+    body, requests_seen = fetch_with_statuses([429, 503])
+
+    assert body == b"png bytes"
+    assert len(requests_seen) == 3
+
+
+def test_retries_truncated_bodies():
+    body, requests_seen = fetch_with_statuses([TRUNCATED])
+
+    assert body == b"png bytes"
+    assert len(requests_seen) == 2
+
+
+def test_gives_up_after_max_retries():
+    with pytest.raises(aiohttp.ClientResponseError) as excinfo:
+        fetch_with_statuses([429] * (figma_screenshot.MAX_RETRIES + 1))
+
+    assert excinfo.value.status == 429
+
+
+def test_does_not_retry_client_errors():
+    with pytest.raises(aiohttp.ClientResponseError) as excinfo:
+        fetch_with_statuses([404])
+
+    assert excinfo.value.status == 404
+
+
+def test_duplicate_frame_names_get_unique_paths():
+    figma_data = {"document": {"children": [{
+        "type": "CANVAS",
+        "name": "Home",
+        "children": [
+            {"id": "1:2", "name": "Frame 1"},
+            {"id": "1:3", "name": "Frame 1"},
+            {"id": "1:4", "name": "Login"},
+        ],
+    }]}}
+
+    nodes = figma_screenshot.collect_nodes(figma_data)
+
+    paths = [output_path for _, output_path in nodes.values()]
+    assert len(set(paths)) == 3
+    assert paths[0].endswith("Home_Frame 1.png")
+    assert paths[1].endswith("Home_Frame 1_1_3.png")
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.figma.com/file/AbC123/My-Project", "AbC123"),
+    ("https://www.figma.com/design/AbC123/My-Project", "AbC123"),
+    ("https://www.figma.com/design/AbC123/My-Project?node-id=1-2&t=xyz", "AbC123"),
+    ("https://www.figma.com/design/AbC123?node-id=1-2", "AbC123"),
+    ("https://www.figma.com/design/AbC123/branch/BrX789/My-Project", "BrX789"),
+    ("https://example.com/design/AbC123", None),
+])
+def test_get_figma_file_key(url, expected):
+    assert figma_screenshot.get_figma_file_key(url) == expected
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import app.roadmap_generator as roadmap_generator
+
+
+class FakeCompletions:
+    def __init__(self, replies):
+        self.replies = replies
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.replies.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, completions):
+        self.chat = SimpleNamespace(completions=completions)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def write_image(tmp_path, name, data=b"\x89PNG fake image"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def fake_openai(tmp_path, monkeypatch):
+    monkeypatch.setattr(roadmap_generator, "CACHE_DIR", str(tmp_path / "cache"))
+    completions = FakeCompletions([])
+    monkeypatch.setattr(roadmap_generator.openai, "AsyncOpenAI", lambda **kwargs: FakeAsyncOpenAI(completions))
+    return completions
+
+
+def test_second_run_uses_cache(tmp_path, fake_openai):
+    image = write_image(tmp_path, "a.png")
+    fake_openai.replies.append(json.dumps({"descriptions": [{"index": 0, "description": "A login screen"}]}))
+
+    first = asyncio.run(roadmap_generator.analyze_all_images([image]))
+    second = asyncio.run(roadmap_generator.analyze_all_images([image]))
+
+    assert len(fake_openai.calls) == 1
+    assert first == second == [{"image": "a.png", "description": "A login screen"}]
+
+
+def test_prompt_or_model_change_invalidates_cache(tmp_path, fake_openai, monkeypatch):
+    image = write_image(tmp_path, "a.png")
+    fake_openai.replies.append(json.dumps({"descriptions": [{"index": 0, "description": "old"}]}))
+    fake_openai.replies.append(json.dumps({"descriptions": [{"index": 0, "description": "new"}]}))
+
+    asyncio.run(roadmap_generator.analyze_all_images([image]))
+    monkeypatch.setattr(roadmap_generator, "CACHE_VERSION", "other")
+    analyses = asyncio.run(roadmap_generator.analyze_all_images([image]))
+
+    assert len(fake_openai.calls) == 2
+    assert analyses == [{"image": "a.png", "description": "new"}]
+
+
+def test_corrupt_cache_entry_is_a_miss(tmp_path, monkeypatch):
+    monkeypatch.setattr(roadmap_generator, "CACHE_DIR", str(tmp_path))
+    with open(roadmap_generator.get_cache_path("deadbeef"), "w", encoding="utf-8") as f:
+        f.write('{"descr')
+
+    assert roadmap_generator.load_cached_analysis("deadbeef") is None
+
+
+def analyze_batch(image_paths, reply):
+    client = FakeAsyncOpenAI(FakeCompletions([reply]))
+    return asyncio.run(roadmap_generator.analyze_images_with_gpt4(image_paths, client, asyncio.Semaphore(1)))
+
+
+@pytest.mark.parametrize("items", [
+    [{"index": 0, "description": "first"}, {"index": 1, "description": "second"}],
+    [{"index": "1", "description": "second"}, {"index": "0", "description": "first"}],
+    [{"index": 1, "description": "first"}, {"index": 2, "description": "second"}],
+    [{"index": 2, "description": "second"}, {"index": 1, "description": "first"}],
+])
+def test_batch_reply_is_mapped_to_images(tmp_path, items):
+    images = [write_image(tmp_path, "a.png"), write_image(tmp_path, "b.png")]
+
+    analyses = analyze_batch(images, json.dumps({"descriptions": items}))
+
+    assert analyses == [
+        {"image": "a.png", "description": "first"},
+        {"image": "b.png", "description": "second"},
+    ]
+
+
+def test_malformed_item_only_affects_its_image(tmp_path):
+    images = [write_image(tmp_path, "a.png"), write_image(tmp_path, "b.png")]
+    reply = json.dumps({"descriptions": [{"index": 0}, {"index": 1, "description": "second"}]})
+
+    analyses = analyze_batch(images, reply)
+
+    assert analyses == [
+        {"image": "a.png", "description": roadmap_generator.ANALYSIS_ERROR},
+        {"image": "b.png", "description": "second"},
+    ]
+
+
+@pytest.mark.parametrize("items", [
+    [{"index": 1, "description": "first"}, {"index": 2, "description": "second"}],
+    [{"description": "first"}, {"description": "second"}, {"description": "third"}],
+    [{"index": 0, "description": "first"}, {"index": 0, "description": "second"}, {"index": 1, "description": "third"}],
+])
+def test_ambiguous_reply_is_not_placed(tmp_path, items):
+    images = [write_image(tmp_path, name) for name in ("a.png", "b.png", "c.png")]
+
+    analyses = analyze_batch(images, json.dumps({"descriptions": items}))
+
+    assert [analysis["description"] for analysis in analyses] == [roadmap_generator.ANALYSIS_ERROR] * 3